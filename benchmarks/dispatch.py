@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the dispatch cost per update with all of the bot's command handlers
+registered, comparing one aiogram handler per command with the #CommandRouter.
+
+    $ python benchmarks/dispatch.py
+"""
+
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, types
+
+from machma import bot as machma_bot
+from machma.utils.aiogram.dispatcher import ProxyDispatcher
+
+UPDATES = ['/help', '/todos', '/done 10 Dips', '/übungen', '/zutun@machma10bot', 'no command']
+ROUNDS = 5000
+
+
+async def noop(*args, **kwargs):  # pylint: disable=unused-argument
+    pass
+
+
+def make_bot() -> Bot:
+    bot = Bot(token='123456:ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghi')
+    me = types.User(id=123456, is_bot=True, first_name='Machma10', username='machma10bot')
+    bot._me = me  # pylint: disable=protected-access
+    Bot.set_current(bot)
+    return bot
+
+
+def make_filter_dispatcher(bot: Bot) -> Dispatcher:
+    dp = Dispatcher(bot)
+    for commands, _func, _dedupe in machma_bot.dp._commands:  # pylint: disable=protected-access
+        dp.message_handler(commands=list(commands))(noop)
+    return dp
+
+
+def make_router_dispatcher(bot: Bot) -> Dispatcher:
+    proxy = ProxyDispatcher()
+    for commands, _func, _dedupe in machma_bot.dp._commands:  # pylint: disable=protected-access
+        proxy.command(*commands)(noop)
+    return proxy.to_dispatcher(bot)
+
+
+def make_updates():
+    return [
+        types.Update(update_id=index, message={
+            'message_id': index,
+            'chat': {'id': 1, 'type': 'group'},
+            'from': {'id': 2, 'is_bot': False, 'first_name': 'Eve'},
+            'text': text,
+        })
+        for index, text in enumerate(UPDATES)
+    ]
+
+
+async def measure(dp: Dispatcher) -> float:
+    updates = make_updates()
+    for update in updates:  # Warm up, e.g. resolve the bot's username.
+        await dp.process_update(update)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for update in updates:
+            await dp.process_update(update)
+    return (time.perf_counter() - start) / (ROUNDS * len(updates))
+
+
+def main():
+    bot = make_bot()
+    loop = asyncio.new_event_loop()
+    for name, factory in [('filters', make_filter_dispatcher), ('router', make_router_dispatcher)]:
+        per_update = loop.run_until_complete(measure(factory(bot)))
+        print('{:<8} {:8.2f} µs/update'.format(name, per_update * 1e6))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
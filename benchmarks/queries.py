@@ -0,0 +1,80 @@
+"""
+Benchmark of the per-call overhead of the reps queries in #machma.api, split into building the
+ORM query, compiling it to SQL and executing it, compared with the baked (cached) queries.
+
+    $ python benchmarks/queries.py
+"""
+
+import random
+import time
+
+from machma import api, db
+from machma.db import session
+
+EXERCISES = 100
+USERS = 50
+ROUNDS = 500
+
+
+def create_data():
+    rng = random.Random(42)
+    for user_id in range(USERS):
+        session.add(db.User(user_id=user_id, first_name='User {}'.format(user_id)))
+    for index in range(EXERCISES):
+        name = 'Exercise {:03d}'.format(index)
+        session.add(db.Exercise(exercise_name=name))
+        for user_id in rng.sample(range(USERS), USERS // 2):
+            session.add(db.UserReps(user_id=user_id, exercise_name=name, reps=rng.randint(1, 100)))
+
+
+def timeit(func) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def bench(name, build, params):
+    dialect = session.get_bind().dialect
+    query = build(session)
+    compiled = query.statement.compile(dialect=dialect)
+    sql = str(compiled)
+    positional = tuple(params.get(key, compiled.params.get(key)) for key in compiled.positiontup)
+    raw = session.connection().connection
+
+    def execute():
+        cursor = raw.cursor()
+        cursor.execute(sql, positional)
+        cursor.fetchall()
+        cursor.close()
+
+    t_build = timeit(lambda: build(session))
+    t_compile = timeit(lambda: build(session).statement.compile(dialect=dialect))
+    t_execute = timeit(execute)
+    t_orm = timeit(lambda: build(session).params(**params).all())
+    t_baked = timeit(lambda: api.bakery(build)(session).params(**params).all())
+
+    print('{:<22} {:>8.1f} {:>8.1f} {:>8.1f} {:>10.1f} {:>8.1f}'.format(
+        name, t_build * 1e6, (t_compile - t_build) * 1e6, t_execute * 1e6, t_orm * 1e6, t_baked * 1e6))
+
+
+def main():
+    db.initialize_db('sqlite:///:memory:', create_tables=True)
+    with db.make_session():
+        create_data()
+
+    with db.make_read_session():
+        print('{:<22} {:>8} {:>8} {:>8} {:>10} {:>8}'.format(
+            'µs/call', 'build', 'compile', 'execute', 'uncached', 'baked'))
+        bench('max_reps', api._max_reps_query, {})  # pylint: disable=protected-access
+        bench('user_reps', api._user_reps_query, {'user_id': 1})  # pylint: disable=protected-access
+        bench('user_todo_reps', api._user_todo_reps_query, {'user_id': 1})  # pylint: disable=protected-access
+        bench(
+            'todo_reps_for_exercise',
+            lambda sess: api._filter_exercise(api._user_todo_reps_query(sess)),  # pylint: disable=protected-access
+            {'user_id': 1, 'exercise': 'Exercise 042'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Memory and latency benchmark of the Core read path in #machma.api compared to reading the same
+data through ORM instances, on a large synthetic dataset.
+
+    $ python benchmarks/reads.py
+"""
+
+import random
+import time
+import tracemalloc
+
+from machma import api, db
+from machma.db import session, Exercise, User
+
+EXERCISES = 2000
+USERS = 1000
+REPS_PER_EXERCISE = 25
+ROUNDS = 10
+
+
+def create_data():
+    rng = random.Random(42)
+    conn = session.connection()
+    conn.execute(User.__table__.insert(), [
+        {'user_id': user_id, 'first_name': 'User {}'.format(user_id)} for user_id in range(USERS)])
+    conn.execute(Exercise.__table__.insert(), [
+        {'exercise_name': 'Exercise {:04d}'.format(index)} for index in range(EXERCISES)])
+    conn.execute(db.UserReps.__table__.insert(), [
+        {'user_id': user_id, 'exercise_name': 'Exercise {:04d}'.format(index), 'reps': rng.randint(1, 100)}
+        for index in range(EXERCISES)
+        for user_id in rng.sample(range(USERS), REPS_PER_EXERCISE)])
+
+
+def orm_get_user(user_id):
+    user = session.query(User).filter(User.user_id == user_id).first()
+    return user and {'id': user.user_id, 'first_name': user.first_name}
+
+
+def orm_has_user(user_id):
+    return session.query(User).filter(User.user_id == user_id).count() != 0
+
+
+def orm_get_exercises():
+    return {r.exercise_name: {'link': r.exercise_link} for r in session.query(Exercise).all()}
+
+
+def measure(func):
+    """
+    Returns the mean latency and the peak memory allocated during a call in a fresh session.
+    """
+
+    with db.make_read_session():
+        func()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        with db.make_read_session():
+            func()
+    latency = (time.perf_counter() - start) / ROUNDS
+    with db.make_read_session():
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return latency, peak
+
+
+def main():
+    db.initialize_db('sqlite:///:memory:', create_tables=True)
+    with db.make_session():
+        create_data()
+
+    cases = [
+        ('get_user', lambda: orm_get_user(USERS // 2), lambda: api.get_user(USERS // 2)),
+        ('has_user', lambda: orm_has_user(USERS // 2), lambda: api.has_user(USERS // 2)),
+        ('get_exercises', orm_get_exercises, api.get_exercise_rows),
+    ]
+    print('{:<15} {:>12} {:>12} {:>12} {:>12}'.format('', 'orm µs', 'core µs', 'orm KiB', 'core KiB'))
+    for name, orm_func, core_func in cases:
+        orm_latency, orm_peak = measure(orm_func)
+        core_latency, core_peak = measure(core_func)
+        print('{:<15} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}'.format(
+            name, orm_latency * 1e6, core_latency * 1e6, orm_peak / 1024, core_peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 
 import code
+import datetime
 import logging
 import sys
 from pathlib import Path
@@ -8,7 +9,8 @@ from typing import Optional
 import click
 
 from machma.tests.dummy_data import create_dummy_data
-from . import api, bot, db
+from . import api, bot, db, profiling
+from .digest import DigestScheduler
 from .config import Config
 
 LOGGER = logging.getLogger(__name__)
@@ -19,6 +21,10 @@ LOGGER = logging.getLogger(__name__)
 @click.option('--dummy-data', is_flag=True, help='Initialize the ethereal DB with dummy data.')
 @click.option('--create-tables', is_flag=True, help='Create tables when initializing the DB connection.')
 @click.option('--sql-debug', is_flag=True, help='Echo SQL statements as they get executed.')
+@click.option('--profile', 'profile_dir', type=Path, help='Write sampled per-handler CPU profiles to this directory.')
+@click.option('--profile-every', type=int, default=10, help='Profile every N-th handler invocation (default: 10).')
+@click.option('--slow-query-ms', type=float, help='Log SQL statements that take at least this many milliseconds, '
+              'together with their EXPLAIN plan and the handler that issued them.')
 @click.option('--config', 'config_file', type=Path, default='config.toml', help='Path to the TOML configuration file.')
 @click.pass_context
 def cli(
@@ -27,6 +33,9 @@ def cli(
     dummy_data: bool,
     create_tables: bool,
     sql_debug: bool,
+    profile_dir: Optional[Path],
+    profile_every: int,
+    slow_query_ms: Optional[float],
     config_file: Path,
 ) -> None:
     """
@@ -41,19 +50,36 @@ def cli(
 
     if ethereal_db:
         config.database_url = 'sqlite:///:memory:'
+        config.read_database_url = None
         create_tables = True
     if dummy_data:
         if not ethereal_db:
             LOGGER.error('--dummy-data requires that the --ethereal-db option is present.')
             sys.exit(1)
 
-    db.initialize_db(config.database_url, create_tables=create_tables, echo=sql_debug)
+    if slow_query_ms is not None:
+        profiling.SlowQueryLog(slow_query_ms / 1000).attach()
+
+    db.initialize_db(
+        config.database_url,
+        read_url=config.read_database_url,
+        create_tables=create_tables,
+        echo=sql_debug,
+    )
     if dummy_data:
         with db.make_session():
             create_dummy_data()
 
     if not ctx.invoked_subcommand:
-        bot.run(config.api_token)
+        profiler = profiling.HandlerProfiler(profile_dir, sample_every=profile_every) if profile_dir else None
+        scheduler = None
+        if config.digest:
+            scheduler = DigestScheduler(
+                datetime.time.fromisoformat(config.digest.time),
+                chats=config.digest.chats,
+                stagger=config.digest.stagger,
+            )
+        bot.run(config.api_token, profiler=profiler, scheduler=scheduler)
 
 
 @cli.command()
@@ -3,12 +3,16 @@
 Provides an API to interact with the database.
 """
 
-from typing import Any, Dict, Optional
+import functools
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
+from sqlalchemy.ext import baked
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql import and_, bindparam, exists, literal_column, select
+from sqlalchemy.util import LRUCache
 
 from . import db
-from .db import session, Exercise, ExerciseAlias, User, UserReps, F
+from .db import session, ChatMember, Exercise, ExerciseAlias, User, UserReps, F
 
 
 class ApiError(Exception):
@@ -41,35 +45,170 @@ class ExerciseDoesNotExistError(ExerciseError):
     pass
 
 
-def _get_max_reps():
+class UserRow(NamedTuple):
+    user_id: int
+    user_name: Optional[str]
+    first_name: str
+    last_name: Optional[str]
+
+
+class ExerciseRow(NamedTuple):
+    exercise_name: str
+    exercise_link: Optional[str]
+
+
+#: Caches the compiled form of the Core statements below.
+_compiled_cache = LRUCache(100)
+
+
+def _execute(statement, **params):
+    """
+    Executes a Core *statement* on the connection of the current session, bypassing the ORM.
+    Rows are never turned into instances and never enter the session's identity map. Pending
+    changes are flushed first if the session has autoflush enabled, like a #Query would.
+    """
+
+    if session.autoflush:
+        session.flush()
+    connection = session.connection().execution_options(compiled_cache=_compiled_cache)
+    return connection.execute(statement, params)
+
+
+def _exists(table, *criteria):
+    return select([exists(select([literal_column('1')]).select_from(table).where(and_(*criteria)).limit(1))])
+
+
+_users = User.__table__
+_exercises = Exercise.__table__
+_exercise_aliases = ExerciseAlias.__table__
+_chat_members = ChatMember.__table__
+
+_select_user = select([_users.c.user_id, _users.c.user_name, _users.c.first_name, _users.c.last_name]) \
+    .where(_users.c.user_id == bindparam('user_id'))
+_select_exercises = select([_exercises.c.exercise_name, _exercises.c.exercise_link])
+_select_exercise_by_alias = select([_exercise_aliases.c.exercise_name]) \
+    .where(_exercise_aliases.c.exercise_alias == bindparam('alias'))
+
+
+def _is_reversed(has_after: bool, has_before: bool) -> bool:
+    # With only an upper bound, the page just before it is selected in descending order and
+    # the rows must be flipped back into ascending order.
+    return has_before and not has_after
+
+
+@functools.lru_cache(maxsize=None)
+def _select_exercises_page(after: bool, before: bool, limit: bool):
+    # Reuse the same statement objects so that their compiled form is cached.
+    statement = _select_exercises
+    column = _exercises.c.exercise_name
+    if after:
+        statement = statement.where(column > bindparam('after'))
+    if before:
+        statement = statement.where(column < bindparam('before'))
+    statement = statement.order_by(column.desc() if _is_reversed(after, before) else column)
+    if limit:
+        statement = statement.limit(bindparam('limit'))
+    return statement
+
+
+_user_exists = _exists(_users, _users.c.user_id == bindparam('user_id'))
+_exercise_exists = _exists(_exercises, _exercises.c.exercise_name == bindparam('exercise'))
+_alias_exists = _exists(_exercise_aliases, _exercise_aliases.c.exercise_alias == bindparam('alias'))
+_chat_member_exists = _exists(
+    _chat_members,
+    _chat_members.c.chat_id == bindparam('chat_id'),
+    _chat_members.c.user_id == bindparam('user_id'))
+
+
+#: Caches the construction and compilation of the queries below (see [1]).
+#:
+#: [1]: https://docs.sqlalchemy.org/en/13/orm/extensions/baked.html
+bakery = baked.bakery()
+
+
+def _key(query):
+    # All of the reps and exercise queries select the exercise name first.
+    return query.column_descriptions[0]['expr']
+
+
+def _filter_after(query):
+    return query.filter(_key(query) > bindparam('after'))
+
+
+def _filter_before(query):
+    return query.filter(_key(query) < bindparam('before'))
+
+
+def _filter_exercise(query):
+    return query.filter(_key(query) == bindparam('exercise'))
+
+
+def _order_ascending(query):
+    return query.order_by(_key(query))
+
+
+def _order_descending(query):
+    return query.order_by(_key(query).desc())
+
+
+def _limit(query):
+    return query.limit(bindparam('limit'))
+
+
+def _paginate(
+    bq: baked.BakedQuery,
+    params: Dict[str, Any],
+    after: Optional[str],
+    before: Optional[str],
+    limit: Optional[int],
+) -> List[Tuple]:
+    """
+    Applies keyset pagination to the baked query *bq*, ordered by exercise name, and returns the
+    rows. Returns the rows with a key greater than *after* and/or less than *before*. If only
+    *before* is specified, the *limit* rows just before it are returned (as opposed to the first
+    *limit* rows).
+    """
+
+    params = dict(params)
+    if after is not None:
+        bq = bq.with_criteria(_filter_after)
+        params['after'] = after
+    if before is not None:
+        bq = bq.with_criteria(_filter_before)
+        params['before'] = before
+    reverse = _is_reversed(after is not None, before is not None)
+    bq = bq.with_criteria(_order_descending if reverse else _order_ascending)
+    if limit is not None:
+        bq = bq.with_criteria(_limit)
+        params['limit'] = limit
+    rows = bq(session).params(**params).all()
+    return rows[::-1] if reverse else rows
+
+
+def _max_reps_query(sess):
     return (
-        session
+        sess
         .query(Exercise.exercise_name, F.max(F.coalesce(UserReps.reps, 0)).label('reps'))
         .group_by(Exercise.exercise_name)
         .outerjoin(UserReps))
 
 
-def _get_user_reps(user_id: int):
-    # Ensure that the user actually exists.
-    user = session.query(User).filter(User.user_id == user_id).first()
-    if not user:
-        raise UserDoesNotExistError(user_id)
-    # Get a subquery for the reps of that user.
-    user_reps = user.reps.subquery()
+def _user_reps_query(sess):
+    # Get a subquery for the reps of the user.
+    user_reps = sess.query(UserReps).filter(UserReps.user_id == bindparam('user_id')).subquery()
     # Left outer join the reps on th exercises.
-    query = (
-        session
+    return (
+        sess
         .query(Exercise.exercise_name, F.coalesce(user_reps.c.reps, 0).label('reps'))
         .select_from(Exercise)
         .outerjoin(user_reps))
-    return query
 
 
-def _get_user_todo_reps(user_id: int):
-    max_reps = _get_max_reps().subquery()
-    user_reps = _get_user_reps(user_id).subquery()
+def _user_todo_reps_query(sess):
+    max_reps = _max_reps_query(sess).subquery()
+    user_reps = _user_reps_query(sess).subquery()
     return (
-        session
+        sess
         .query(
             max_reps.c.exercise_name.label('exercise_name'),
             (max_reps.c.reps - user_reps.c.reps).label('reps'),
@@ -79,19 +218,56 @@ def _get_user_todo_reps(user_id: int):
         ))
 
 
-def _get_reps_for_exercise(query, exercise: str) -> int:
-    # TODO(NiklasRosenstein): This doesn't seem quite like the right way to do this.
-    #   Check https://stackoverflow.com/q/63728782/791713 for suggestions.
-    query = query.subquery()
-    query = session.query(*query.c).filter(query.c.exercise_name == exercise)
+def _chat_todo_reps_query(sess):
+    max_reps = _max_reps_query(sess).subquery()
+    done = F.coalesce(UserReps.reps, 0)
+    return (
+        sess
+        .query(User.user_id, User.first_name, max_reps.c.exercise_name, (max_reps.c.reps - done).label('reps'))
+        .select_from(ChatMember)
+        .join(User, User.user_id == ChatMember.user_id)
+        .join(max_reps, max_reps.c.reps > 0)
+        .outerjoin(UserReps, and_(
+            UserReps.user_id == ChatMember.user_id,
+            UserReps.exercise_name == max_reps.c.exercise_name))
+        .filter(ChatMember.chat_id == bindparam('chat_id'))
+        .filter(max_reps.c.reps > done)
+        .order_by(User.first_name, User.user_id, max_reps.c.exercise_name))
+
+
+def _get_max_reps() -> Tuple[baked.BakedQuery, Dict[str, Any]]:
+    return bakery(_max_reps_query), {}
+
+
+def _get_user_reps(user_id: int) -> Tuple[baked.BakedQuery, Dict[str, Any]]:
+    # Ensure that the user actually exists.
+    if not has_user(user_id):
+        raise UserDoesNotExistError(user_id)
+    return bakery(_user_reps_query), {'user_id': user_id}
+
+
+def _get_user_todo_reps(user_id: int) -> Tuple[baked.BakedQuery, Dict[str, Any]]:
+    if not has_user(user_id):
+        raise UserDoesNotExistError(user_id)
+    return bakery(_user_todo_reps_query), {'user_id': user_id}
+
+
+def _get_reps_for_exercise(query: Tuple[baked.BakedQuery, Dict[str, Any]], exercise: str) -> int:
+    bq, params = query
+    bq = bq.with_criteria(_filter_exercise)
     try:
-        return query.one()[1]
+        return bq(session).params(exercise=exercise, **params).one()[1]
     except NoResultFound:
         raise ExerciseDoesNotExistError(exercise)
 
 
+def get_user_row(user_id: int) -> Optional[UserRow]:
+    row = _execute(_select_user, user_id=user_id).first()
+    return UserRow(*row) if row else None
+
+
 def get_user(user_id: int) -> Optional[Dict[str, Any]]:
-    user = session.query(User).filter(User.user_id == user_id).first()
+    user = get_user_row(user_id)
     if user:
         return {
             'id': user.user_id,
@@ -102,33 +278,91 @@ def get_user(user_id: int) -> Optional[Dict[str, Any]]:
 
 
 def has_user(user_id: int) -> bool:
-    return session.query(User).filter(User.user_id == user_id).count() != 0
+    return bool(_execute(_user_exists, user_id=user_id).scalar())
 
 
 def get_max_reps() -> Dict[str, int]:
-    return dict(_get_max_reps())
+    bq, params = _get_max_reps()
+    return dict(bq(session).params(**params))
 
 
 def get_max_reps_for_exercise(exercise: str) -> int:
     return _get_reps_for_exercise(_get_max_reps(), exercise)
 
 
-def get_user_reps(user_id: int) -> Dict[str, int]:
-    return dict(_get_user_reps(user_id))
+def get_user_reps(
+    user_id: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Returns the reps of the user per exercise, ordered by exercise name. Use *after*, *before*
+    and *limit* to retrieve a single page (see #_paginate()).
+    """
+
+    return dict(_paginate(*_get_user_reps(user_id), after, before, limit))
 
 
 def get_user_reps_for_exercise(user_id: int, exercise: str) -> int:
     return _get_reps_for_exercise(_get_user_reps(user_id), exercise)
 
 
-def get_user_todo_reps(user_id: int) -> Dict[str, int]:
-    return dict(_get_user_todo_reps(user_id))
+def get_user_todo_reps(
+    user_id: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Returns the reps that the user has yet to do per exercise, ordered by exercise name. Use
+    *after*, *before* and *limit* to retrieve a single page (see #_paginate()).
+    """
+
+    return dict(_paginate(*_get_user_todo_reps(user_id), after, before, limit))
 
 
 def get_user_todo_reps_for_exercise(user_id: int, exercise: str) -> int:
     return _get_reps_for_exercise(_get_user_todo_reps(user_id), exercise)
 
 
+def get_chat_todo_reps(chat_id: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Returns the outstanding reps of all members of the specified chat in a single query. Members
+    that have nothing left to do are omitted.
+
+    ```py
+    {user_id: {'first_name': str, 'todos': {exercise_name: reps}}}
+    ```
+    """
+
+    rows = bakery(_chat_todo_reps_query)(session).params(chat_id=chat_id)
+
+    result: Dict[int, Dict[str, Any]] = {}
+    for user_id, first_name, exercise_name, reps in rows:
+        member = result.setdefault(user_id, {'first_name': first_name, 'todos': {}})
+        member['todos'][exercise_name] = reps
+    return result
+
+
+def get_chats() -> List[int]:
+    """
+    Returns the IDs of all group chats that have known members. Telegram assigns negative IDs
+    to groups and the user's own (positive) ID to private chats, which are skipped.
+    """
+
+    query = session.query(ChatMember.chat_id).filter(ChatMember.chat_id < 0)
+    return [row[0] for row in query.distinct().order_by(ChatMember.chat_id)]
+
+
+def is_chat_member(chat_id: int, user_id: int) -> bool:
+    return bool(_execute(_chat_member_exists, chat_id=chat_id, user_id=user_id).scalar())
+
+
+def add_chat_member(chat_id: int, user_id: int) -> None:
+    db.get(ChatMember, on=dict(chat_id=chat_id, user_id=user_id), or_create={})
+
+
 def add_to_user_reps(user_id: int, exercise: str, reps: int) -> None:
     if not has_exercise(exercise):
         raise ExerciseDoesNotExistError(exercise)
@@ -141,25 +375,27 @@ def add_to_user_reps(user_id: int, exercise: str, reps: int) -> None:
 
 
 def get_exercise_by_alias(alias: str) -> Optional[str]:
-    row = (session.query(ExerciseAlias.exercise_name)
-           .filter(ExerciseAlias.exercise_alias == alias).first())
-    if row:
-        return row[0]
-    return None
+    return _execute(_select_exercise_by_alias, alias=alias).scalar()
+
+
+def get_aliases() -> Dict[str, str]:
+    """
+    Returns a mapping of all aliases to their exercise name.
+    """
+
+    return dict(session.query(ExerciseAlias.exercise_alias, ExerciseAlias.exercise_name))
 
 
 def add_alias(alias, exercise):
     session.add(ExerciseAlias(exercise_alias=alias, exercise_name=exercise))
 
 
-def has_alias(alias: str) -> None:
-    return (session.query(ExerciseAlias)
-            .filter(ExerciseAlias.exercise_alias == alias).count()) > 0
+def has_alias(alias: str) -> bool:
+    return bool(_execute(_alias_exists, alias=alias).scalar())
 
 
-def has_exercise(exercise: str) -> None:
-    return (session.query(Exercise)
-            .filter(Exercise.exercise_name == exercise).count()) > 0
+def has_exercise(exercise: str) -> bool:
+    return bool(_execute(_exercise_exists, exercise=exercise).scalar())
 
 
 def add_exercise(exercise: str, link: Optional[str] = None) -> None:
@@ -167,9 +403,34 @@ def add_exercise(exercise: str, link: Optional[str] = None) -> None:
     session.add(ExerciseAlias(exercise_alias=exercise, exercise_name=exercise))
 
 
-def get_exercises() -> Dict[str, Dict[str, Any]]:
-    rows = session.query(Exercise).all()
-    return {r.exercise_name: {'link': r.exercise_link} for r in rows}
+def get_exercise_rows(
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[ExerciseRow]:
+    """
+    Returns the exercises ordered by name. Use *after*, *before* and *limit* to retrieve a
+    single page, with the same semantics as #_paginate().
+    """
+
+    reverse = _is_reversed(after is not None, before is not None)
+    statement = _select_exercises_page(after is not None, before is not None, limit is not None)
+    params = {'after': after, 'before': before, 'limit': limit}
+    rows = [ExerciseRow(*row) for row in _execute(statement, **params)]
+    return rows[::-1] if reverse else rows
+
+
+def get_exercises(
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Like #get_exercise_rows(), but returns a dictionary that maps exercise names to their info.
+    """
+
+    rows = get_exercise_rows(after, before, limit)
+    return {row.exercise_name: {'link': row.exercise_link} for row in rows}
 
 
 def set_exercise_link(exercise: str, link: Optional[str]) -> None:
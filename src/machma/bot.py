@@ -1,25 +1,61 @@
 
+import hashlib
 import html
 import logging
 import textwrap
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from aiogram import Bot, executor, types
+from aiogram.utils.exceptions import MessageNotModified
 from tabulate import tabulate
 
-from . import api, db
+from . import api, db, profiling
+from .digest import DigestScheduler
+from .inline import InlineIndex
 from .utils.aiogram.dispatcher import ProxyDispatcher
+from .utils.aiogram.limiter import UpdateLimiter
 
-dp = ProxyDispatcher()
+dp = ProxyDispatcher(limiter=UpdateLimiter())
 
+#: The number of rows shown per page by /todos and /exercises.
+PAGE_SIZE = 15
 
-def run(api_token: str) -> None:
+#: Telegram limits callback data to 64 bytes.
+MAX_CALLBACK_DATA = 64
+
+#: Seconds for which Telegram clients may cache the answer to an inline query.
+INLINE_CACHE_TIME = 30
+
+inline_index = InlineIndex()
+inline_index.attach()
+
+
+def run(
+    api_token: str,
+    profiler: Optional[profiling.HandlerProfiler] = None,
+    scheduler: Optional[DigestScheduler] = None,
+) -> None:
     bot = Bot(token=api_token)
-    executor.start_polling(dp.to_dispatcher(bot), skip_updates=True)
+    wrapper = profiler.wrap if profiler else profiling.track_handler
 
+    async def on_startup(dispatcher):
+        if scheduler:
+            scheduler.start(dispatcher.bot)
 
-@dp.message_handler(commands=['help', 'hilfe', 'commands', 'befehle'])
-@db.async_session
-async def send_help(message: types.Message):
+    async def on_shutdown(dispatcher):  # pylint: disable=unused-argument
+        if scheduler:
+            scheduler.stop()
+
+    executor.start_polling(
+        dp.to_dispatcher(bot, wrapper=wrapper),
+        skip_updates=True,
+        on_startup=on_startup,
+        on_shutdown=on_shutdown,
+    )
+
+
+@dp.command('help', 'hilfe', 'commands', 'befehle', dedupe=True)
+async def send_help(message: types.Message, args: List[str]):  # pylint: disable=unused-argument
     commands = [
         ('/help', 'Diese Hilfe'),
         ('/exercise [name] [link]?', 'Neue Übung mit optionalem Link'),
@@ -34,11 +70,9 @@ async def send_help(message: types.Message):
     await message.answer(table, parse_mode = 'html')
 
 
-@dp.message_handler(commands=['exercise', 'übung'])
+@dp.command('exercise', 'übung')
 @db.async_session
-async def add_exercise(message: types.Message):
-    args = message.get_args().strip().split(' ')
-
+async def add_exercise(message: types.Message, args: List[str]):
     if len(args) < 1:
         await message.answer('Zu wenig Argumente, du Otto.')
     elif len(args) > 2:
@@ -54,11 +88,9 @@ async def add_exercise(message: types.Message):
             await message.answer('Ich kenne jetzt die Übung {}.'.format(exercise))
 
 
-@dp.message_handler(commands=['alias'])
+@dp.command('alias')
 @db.async_session
-async def add_alias(message: types.Message):
-    args = message.get_args().strip().split()
-
+async def add_alias(message: types.Message, args: List[str]):
     if len(args) < 2:
         await message.answer('Zu wenig Argumente, du Otto.')
     elif len(args) > 2:
@@ -75,9 +107,10 @@ async def add_alias(message: types.Message):
             await message.answer('{} oder {}? Alles das gleiche!'.format(alias, exercise_alias))
 
 
-def add_user(user):
+def add_user(user, chat_id):
     if not api.has_user(user['id']):
         api.add_user(user['id'], user['username'], user['first_name'], user['last_name'])
+    api.add_chat_member(chat_id, user['id'])
 
 
 def tg_link(user_id):
@@ -88,26 +121,140 @@ def tg_href(user_id, text):
     return '<a href="{}">{}</a>'.format(tg_link(user_id), text)
 
 
-@dp.message_handler(commands=['todo', 'todos', 'zutun'])
-@db.async_session
-async def show_todos(message: types.Message):
-    from_user = message['from']
-    add_user(from_user)
+def fetch_page(fetch: Callable[..., Dict[str, Any]], direction: str, key: Optional[str]) -> Tuple[Dict[str, Any], bool, bool]:
+    """
+    Fetches a single page via *fetch*, which must accept the keyset pagination arguments of the
+    #api functions. *direction* is either `'after'` or `'before'` the given *key*. Returns the
+    rows of the page and whether there is a previous and a next page.
+    """
+
+    if direction == 'before':
+        rows = fetch(before=key, limit=PAGE_SIZE + 1)
+        keys = list(rows)
+        has_prev, has_next = len(keys) > PAGE_SIZE, True
+        keys = keys[-PAGE_SIZE:]
+    else:
+        rows = fetch(after=key, limit=PAGE_SIZE + 1)
+        keys = list(rows)
+        has_prev, has_next = key is not None, len(keys) > PAGE_SIZE
+        keys = keys[:PAGE_SIZE]
+    return {k: rows[k] for k in keys}, has_prev, has_next
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha1(key.encode('utf8')).hexdigest()[:8]
+
+
+def encode_cursor(key: str, max_bytes: int) -> str:
+    """
+    Encodes the page *key* (an exercise name) so that it fits into *max_bytes*. Keys that are too
+    long are truncated and suffixed with a space and a hash of the full key (exercise names
+    never contain whitespace), which #decode_cursor() resolves back to the full key.
+    """
+
+    if len(key.encode('utf8')) <= max_bytes:
+        return key
+    prefix = key.encode('utf8')[:max_bytes - 9].decode('utf8', 'ignore')
+    return prefix + ' ' + _key_hash(key)
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    Resolves a cursor created with #encode_cursor() to the page key. If the key can not be
+    resolved (e.g. because the exercise was renamed), the truncated prefix is returned, which
+    still continues the navigation from approximately the same position.
+    """
+
+    if ' ' not in cursor:
+        return cursor
+    prefix, key_hash = cursor.split(' ', 1)
+    for row in api.get_exercise_rows(after=prefix, before=prefix + '\U0010ffff'):
+        if _key_hash(row.exercise_name) == key_hash:
+            return row.exercise_name
+    return prefix
+
 
-    todos = api.get_user_todo_reps(from_user['id'])
-    dones = api.get_user_reps(from_user['id'])
+def page_keyboard(prefix: str, rows: Dict[str, Any], has_prev: bool, has_next: bool) -> Optional[types.InlineKeyboardMarkup]:
+    """
+    Creates the inline keyboard to navigate to the previous and next page. The callback data is
+    *prefix* followed by the direction and a cursor for the key to continue from (see
+    #encode_cursor()).
+    """
 
-    stats = [(textwrap.fill(ex, width=12), todos[ex], dones[ex]) for ex in todos]
+    buttons = []
+    keys = list(rows)
+    if has_prev and keys:
+        head = prefix + ':before:'
+        buttons.append(('« Zurück', head + encode_cursor(keys[0], MAX_CALLBACK_DATA - len(head.encode('utf8')))))
+    if has_next and keys:
+        head = prefix + ':after:'
+        buttons.append(('Weiter »', head + encode_cursor(keys[-1], MAX_CALLBACK_DATA - len(head.encode('utf8')))))
+    buttons = [types.InlineKeyboardButton(text, callback_data=data) for text, data in buttons]
+    if not buttons:
+        return None
+    return types.InlineKeyboardMarkup().row(*buttons)
+
+
+async def edit_page(query: types.CallbackQuery, text: str, markup: Optional[types.InlineKeyboardMarkup], **kwargs) -> None:
+    """
+    Replaces the message of the callback *query* with the page and answers the query. Tapping
+    a stale button twice renders the same page again, which Telegram rejects as not modified.
+    """
+
+    try:
+        await query.message.edit_text(text, parse_mode='html', reply_markup=markup, **kwargs)
+    except MessageNotModified:
+        pass
+    finally:
+        await query.answer()
+
+
+def render_todos(user_id: int, first_name: str, direction: str = 'after', key: Optional[str] = None):
+    def fetch(**kwargs):
+        todos = api.get_user_todo_reps(user_id, **kwargs)
+        dones = api.get_user_reps(user_id, **kwargs)
+        return {ex: (todos[ex], dones[ex]) for ex in todos}
+
+    rows, has_prev, has_next = fetch_page(fetch, direction, key)
+    stats = [(textwrap.fill(ex, width=12), todo, done) for ex, (todo, done) in rows.items()]
     table = '<pre>' + html.escape(tabulate(stats, headers=['Übung', 'Todo', 'Done'])) + '</pre>'
-    header = '<b>Todos für {}</b>\n\n'.format(tg_href(from_user['id'], from_user['first_name']))
-    await message.answer(header + table, parse_mode = "html")
+    header = '<b>Todos für {}</b>\n\n'.format(tg_href(user_id, html.escape(first_name)))
+    markup = page_keyboard('todos:{}'.format(user_id), rows, has_prev, has_next)
+    return header + table, markup
 
 
-@dp.message_handler(commands=['machma', 'getan', 'done'])
-@db.async_session
-async def add_reps(message: types.Message):
-    args = message.get_args().strip().split()
+@dp.command('todo', 'todos', 'zutun', dedupe=True)
+@db.async_read_session
+async def show_todos(message: types.Message, args: List[str]):  # pylint: disable=unused-argument
+    from_user = message['from']
+
+    if api.is_chat_member(message.chat.id, from_user['id']):
+        text, markup = render_todos(from_user['id'], from_user['first_name'])
+    else:
+        # We see this user for the first time (in this chat), register them in a read-write session.
+        with db.make_session():
+            add_user(from_user, message.chat.id)
+            text, markup = render_todos(from_user['id'], from_user['first_name'])
+
+    await message.answer(text, parse_mode = "html", reply_markup=markup)
+
 
+@dp.callback_query_handler(text_startswith='todos:')
+@db.async_read_session
+async def show_todos_page(query: types.CallbackQuery):
+    _, user_id, direction, key = query.data.split(':', 3)
+    user = api.get_user_row(int(user_id))
+    if user is None:
+        await query.answer()
+        return
+
+    text, markup = render_todos(user.user_id, user.first_name, direction, decode_cursor(key))
+    await edit_page(query, text, markup)
+
+
+@dp.command('machma', 'getan', 'done')
+@db.async_session
+async def add_reps(message: types.Message, args: List[str]):
     if len(args) < 2:
         await message.answer('Zu wenig Argumente, du Otto.')
     elif len(args) > 2:
@@ -119,7 +266,7 @@ async def add_reps(message: types.Message):
             reps = int(args[0])
 
             from_user = message['from']
-            add_user(from_user)
+            add_user(from_user, message.chat.id)
 
             if exercise is None:
                 await message.answer('Die Übung {} existiert nicht.'.format(exercise_alias))
@@ -133,13 +280,40 @@ async def add_reps(message: types.Message):
             await message.answer('Ne Zahl! Ist das so schwer?')
 
 
-@dp.message_handler(commands=['exercises', 'übungen'])
-@db.async_session
-async def show_exercises(message : types.Message):
-    exercises = api.get_exercises()
+def render_exercises(direction: str = 'after', key: Optional[str] = None):
+    exercises, has_prev, has_next = fetch_page(api.get_exercises, direction, key)
     table = []
     for ex in exercises:
         exercise = html.escape(ex)
         link = exercises[ex]['link']
         table.append(('<a href="{}">{}</a>'.format(link, exercise) if link is not None else exercise,))
-    await message.answer(tabulate(table, headers=['Übung']), parse_mode = 'html', disable_web_page_preview=True)
+    return tabulate(table, headers=['Übung']), page_keyboard('exercises', exercises, has_prev, has_next)
+
+
+@dp.command('exercises', 'übungen', dedupe=True)
+@db.async_read_session
+async def show_exercises(message : types.Message, args: List[str]):  # pylint: disable=unused-argument
+    text, markup = render_exercises()
+    await message.answer(text, parse_mode = 'html', disable_web_page_preview=True, reply_markup=markup)
+
+
+@dp.callback_query_handler(text_startswith='exercises:')
+@db.async_read_session
+async def show_exercises_page(query: types.CallbackQuery):
+    _, direction, key = query.data.split(':', 2)
+    text, markup = render_exercises(direction, decode_cursor(key))
+    await edit_page(query, text, markup, disable_web_page_preview=True)
+
+
+@dp.inline_handler()
+async def answer_inline_query(query: types.InlineQuery):
+    results = []
+    for exercise, todo, done in inline_index.search(query.from_user.id, query.query):
+        text = '{}: {} Todo, {} Done'.format(exercise, todo, done)
+        results.append(types.InlineQueryResultArticle(
+            id=str(len(results)),
+            title=exercise,
+            description='Todo: {} · Done: {}'.format(todo, done),
+            input_message_content=types.InputTextMessageContent(text),
+        ))
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
@@ -1,15 +1,28 @@
 
 from pathlib import Path
+from typing import List, Optional
 
 import toml
 from databind.core import datamodel, field
 from databind.json import from_json
 
 
+@datamodel(strict=True)
+class DigestConfig:
+    #: Local time of day at which to post the digest, formatted as `HH:MM`.
+    time: str
+    #: The chats to post the digest to. Defaults to all chats with known members.
+    chats: Optional[List[int]] = field(default=None)
+    #: Seconds to wait between sending the digest to consecutive chats.
+    stagger: float = field(default=1.0)
+
+
 @datamodel(strict=True)
 class Config:
     api_token: str = field(altname='api-token')
     database_url: str = field(altname='database-url')
+    read_database_url: Optional[str] = field(altname='read-database-url', default=None)
+    digest: Optional[DigestConfig] = field(default=None)
 
     @classmethod
     def load(cls, file: Path) -> 'Config':
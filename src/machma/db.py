@@ -5,7 +5,8 @@ import logging
 from typing import Any, Dict, Optional, Type, TypeVar
 
 import nr.proxy
-from sqlalchemy import create_engine, Column, ForeignKey, Integer, String
+from sqlalchemy import create_engine, event, Column, ForeignKey, Integer, String
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
@@ -15,6 +16,7 @@ from sqlalchemy import func as F
 LOGGER = logging.getLogger(__name__)
 Base = declarative_base()
 Session = sessionmaker()
+ReadSession = sessionmaker(autoflush=False)
 session = nr.proxy.threadlocal[Session](
     name=__name__ + '.session',
     error_message='({name}) No SqlAlchemy session is available. Ensure that you are using the '
@@ -27,28 +29,59 @@ T_Base = TypeVar('T_Base', bound=Base)
 __all__ = [
     'Base',
     'Session',
+    'ReadSession',
     'session',
     'initialize_db',
     'Exercise',
     'ExerciseAlias',
     'User',
     'UserReps',
+    'ChatMember',
     'F',
 ]
 
 
-def initialize_db(*args, create_tables: bool = False, **kwargs):
+def _is_sqlite_file(engine: Engine) -> bool:
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+def _set_sqlite_pragmas(engine: Engine, *pragmas: str) -> None:
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):  # pylint: disable=unused-argument
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute('PRAGMA ' + pragma)
+        cursor.close()
+
+
+def initialize_db(url: str, *args, read_url: Optional[str] = None, create_tables: bool = False, **kwargs):
     """
-    Creates an SqlAlchemy engine and configures the #Session class. The arguments are
-    forwarded to the #create_engine() function (see [1]).
+    Creates the SqlAlchemy engines and configures the #Session and #ReadSession classes. The
+    arguments are forwarded to the #create_engine() function (see [1]).
+
+    If *read_url* is specified, a separate engine is created for the #ReadSession (e.g. pointing
+    to a read replica, or to the same SQLite database file to get a separate connection pool).
+    Otherwise both session classes share the same engine. SQLite database files are switched to
+    WAL mode so that readers do not block a writer (and vice versa).
 
     [1]: https://docs.sqlalchemy.org/en/13/core/engines.html#sqlalchemy.create_engine
     """
 
     LOGGER.info('Initializing SqlAlchemy Session')
-    engine = create_engine(*args, **kwargs)
+    engine = create_engine(url, *args, **kwargs)
+    if _is_sqlite_file(engine):
+        _set_sqlite_pragmas(engine, 'journal_mode=WAL')
     Session.configure(bind=engine)
 
+    if read_url is not None:
+        LOGGER.info('Initializing SqlAlchemy ReadSession')
+        read_engine = create_engine(read_url, *args, **kwargs)
+        if _is_sqlite_file(read_engine):
+            _set_sqlite_pragmas(read_engine, 'journal_mode=WAL', 'query_only=ON')
+    else:
+        read_engine = engine
+    ReadSession.configure(bind=read_engine)
+
     if create_tables:
         Base.metadata.create_all(engine)
 
@@ -57,7 +90,7 @@ def initialize_db(*args, create_tables: bool = False, **kwargs):
 def make_session() -> None:
     """
     A context manager that creates a new #Session object and makes it available in the global
-    #session proxy object.
+    #session proxy object. The session is committed when the context manager exits.
     """
 
     nr.proxy.push(session, Session())
@@ -72,6 +105,33 @@ def make_session() -> None:
         nr.proxy.pop(session)
 
 
+def get_engine(read: bool = False) -> Engine:
+    """
+    Returns the engine that the #Session (or with *read*, the #ReadSession) is bound to.
+    """
+
+    return (ReadSession if read else Session).kw['bind']
+
+
+@contextlib.contextmanager
+def make_read_session(primary: bool = False) -> None:
+    """
+    A context manager that creates a new #ReadSession object and makes it available in the
+    global #session proxy object. The session is never committed; it is closed when the context
+    manager exits, discarding any pending changes.
+
+    If *primary* is set, the session reads from the read-write database instead of the read
+    database, e.g. to not see stale data from a lagging replica right after a write.
+    """
+
+    nr.proxy.push(session, ReadSession(bind=get_engine()) if primary else ReadSession())
+    try:
+        yield
+    finally:
+        session.close()
+        nr.proxy.pop(session)
+
+
 def async_session(func):
     """
     Decorator for an async function that wraps it in a #make_session() call to ensure
@@ -86,6 +146,20 @@ def async_session(func):
     return wrapper
 
 
+def async_read_session(func):
+    """
+    Decorator for an async function that wraps it in a #make_read_session() call to ensure
+    that a read-only session is available.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with make_read_session():
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
 def get(
     entity: Type[T_Base],
     on: Dict[str, Any],
@@ -165,3 +239,10 @@ class UserReps(Base):
 
     user = relationship('User', back_populates='reps')
     exercise = relationship('Exercise', back_populates='reps')
+
+
+class ChatMember(Base):
+    __tablename__ = 'chat_members'
+
+    chat_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
@@ -0,0 +1,108 @@
+"""
+Posts a daily digest of everyone's outstanding reps to the group chats.
+"""
+
+import asyncio
+import datetime
+import html
+import logging
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.utils.exceptions import TelegramAPIError
+from aiogram.utils.parts import MAX_MESSAGE_LENGTH
+
+from . import api, db
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _render_member(user_id: int, member: Dict[str, Any], max_length: int) -> str:
+    # Cut the list of todos short with a "+N weitere" suffix if it doesn't fit into a message.
+    line = '<a href="tg://user?id={}">{}</a>: '.format(user_id, html.escape(member['first_name']))
+    todos = ['{} {}'.format(reps, html.escape(ex)) for ex, reps in member['todos'].items()]
+    for count in range(len(todos), 0, -1):
+        result = line + ', '.join(todos[:count])
+        if count < len(todos):
+            result += ' +{} weitere'.format(len(todos) - count)
+        if len(result) <= max_length:
+            return result
+    return line + '+{} weitere'.format(len(todos))
+
+
+def render_digest(members: Dict[int, Dict[str, Any]], max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Renders the result of #api.get_chat_todo_reps() into as few messages as possible, each at
+    most *max_length* characters long.
+    """
+
+    if not members:
+        return ['<b>Tagesbilanz</b>\n\nAlle sind auf Stand. Stark!']
+    messages = ['<b>Tagesbilanz: Wer schuldet noch was?</b>']
+    for user_id, member in members.items():
+        line = _render_member(user_id, member, max_length)
+        if len(messages[-1]) + 2 + len(line) <= max_length:
+            messages[-1] += '\n\n' + line
+        else:
+            messages.append(line)
+    return messages
+
+
+def seconds_until(time_of_day: datetime.time, now: datetime.datetime) -> float:
+    """
+    Returns the number of seconds from *now* until the next occurrence of *time_of_day*.
+    """
+
+    target = datetime.datetime.combine(now.date(), time_of_day)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class DigestScheduler:
+    """
+    Posts the digest to the specified *chats* every day at *time_of_day* (local time). If no
+    chats are specified, the digest is posted to all group chats that have known members. Sends
+    to different chats are spaced by *stagger* seconds to stay clear of Telegram's rate limits.
+    """
+
+    def __init__(self, time_of_day: datetime.time, chats: Optional[List[int]] = None, stagger: float = 1.0):
+        self.time_of_day = time_of_day
+        self.chats = chats
+        self.stagger = stagger
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_chats(self) -> List[int]:
+        if self.chats is not None:
+            return list(self.chats)
+        with db.make_read_session():
+            return api.get_chats()
+
+    async def send_digests(self, bot: Bot) -> None:
+        for index, chat_id in enumerate(self._get_chats()):
+            if index > 0:
+                await asyncio.sleep(self.stagger)
+            with db.make_read_session():
+                messages = render_digest(api.get_chat_todo_reps(chat_id))
+            try:
+                for text in messages:
+                    await bot.send_message(chat_id, text, parse_mode='html')
+            except TelegramAPIError:
+                LOGGER.exception('Unable to send digest to chat %s', chat_id)
+
+    async def run(self, bot: Bot) -> None:
+        while True:
+            await asyncio.sleep(seconds_until(self.time_of_day, datetime.datetime.now()))
+            LOGGER.info('Sending digests')
+            try:
+                await self.send_digests(bot)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('Unable to send digests')
+
+    def start(self, bot: Bot) -> None:
+        self._task = asyncio.ensure_future(self.run(bot))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
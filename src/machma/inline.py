@@ -0,0 +1,106 @@
+"""
+An in-memory index to answer inline queries without hitting the database on every keystroke.
+"""
+
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.util import LRUCache
+
+from . import api, db
+
+#: Maps exercise names to the (todo, done) reps of a user.
+UserStats = Dict[str, Tuple[int, int]]
+
+
+class InlineIndex:
+    """
+    Holds a prefix index over the exercise and alias catalog and the precomputed stats of the
+    *max_users* most recently active users. Both are loaded lazily from the database and dropped
+    by #invalidate() (see #attach()).
+
+    Since the index is invalidated by writes, it is always loaded from the read-write database,
+    so that a lagging read replica can not leave stale data in the cache.
+    """
+
+    def __init__(self, max_users: int = 1000):
+        self._catalog: Optional[List[Tuple[str, str]]] = None
+        self._keys: List[str] = []
+        self._users: Dict[int, UserStats] = LRUCache(max_users)
+        self._listeners = []
+
+    def _get_catalog(self) -> List[Tuple[str, str]]:
+        if self._catalog is None:
+            with db.make_read_session(primary=True):
+                names = {name: name for name in api.get_exercises()}
+                names.update(api.get_aliases())
+            self._catalog = sorted((name.casefold(), exercise) for name, exercise in names.items())
+            self._keys = [key for key, _ in self._catalog]
+        return self._catalog
+
+    def _get_user_stats(self, user_id: int) -> UserStats:
+        stats = self._users.get(user_id)
+        if stats is None:
+            with db.make_read_session(primary=True):
+                try:
+                    todos = api.get_user_todo_reps(user_id)
+                    dones = api.get_user_reps(user_id)
+                except api.UserDoesNotExistError:
+                    todos = api.get_max_reps()
+                    dones = dict.fromkeys(todos, 0)
+            stats = self._users[user_id] = {ex: (todos[ex], dones[ex]) for ex in todos}
+        return stats
+
+    def match(self, prefix: str) -> List[str]:
+        """
+        Returns the names of all exercises of which the name or an alias starts with *prefix*
+        (case insensitive), in order of the matching keys.
+        """
+
+        catalog = self._get_catalog()
+        prefix = prefix.strip().casefold()
+        result: Dict[str, None] = {}
+        index = bisect.bisect_left(self._keys, prefix)
+        while index < len(catalog) and catalog[index][0].startswith(prefix):
+            result[catalog[index][1]] = None
+            index += 1
+        return list(result)
+
+    def search(self, user_id: int, prefix: str, limit: int = 50) -> List[Tuple[str, int, int]]:
+        """
+        Returns `(exercise, todo, done)` for the exercises matching *prefix* (see #match()).
+        """
+
+        stats = self._get_user_stats(user_id)
+        return [(ex, *stats[ex]) for ex in self.match(prefix)[:limit] if ex in stats]
+
+    def invalidate(self) -> None:
+        self._catalog = None
+        self._keys = []
+        self._users.clear()
+
+    def attach(self, session_class=db.Session) -> None:
+        """
+        Registers event listeners that #invalidate() the index whenever a session of the
+        specified class commits changes. Use #detach() to remove them again.
+        """
+
+        # Every index needs its own flag, as each of them pops it on commit.
+        flag = ('machma_inline_dirty', id(self))
+
+        def _after_flush(session, flush_context):  # pylint: disable=unused-argument
+            session.info[flag] = True
+
+        def _after_commit(session):
+            if session.info.pop(flag, False):
+                self.invalidate()
+
+        for name, func in [('after_flush', _after_flush), ('after_commit', _after_commit)]:
+            event.listen(session_class, name, func)
+            self._listeners.append((session_class, name, func))
+
+    def detach(self) -> None:
+        for target, name, func in self._listeners:
+            event.remove(target, name, func)
+        self._listeners.clear()
@@ -0,0 +1,155 @@
+"""
+Tools to find out why handlers are slow: sampled per-handler CPU profiles and a slow-query log.
+"""
+
+import collections
+import contextvars
+import cProfile
+import functools
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LOGGER = logging.getLogger(__name__)
+SLOW_QUERY_LOGGER = logging.getLogger(__name__ + '.slow_queries')
+
+#: The name of the handler that is currently being executed in this context.
+current_handler: contextvars.ContextVar = contextvars.ContextVar('current_handler', default=None)
+
+
+def track_handler(func: Callable) -> Callable:
+    """
+    Decorator for an async function that makes its name available in #current_handler while
+    it executes.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_handler.set(func.__name__)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_handler.reset(token)
+
+    return wrapper
+
+
+class HandlerProfiler:
+    """
+    Profiles every *sample_every*-th invocation of each handler with #cProfile and writes the
+    stats to *directory*. Only the *keep* most recent profiles are retained per handler.
+
+    Note that only one handler is profiled at a time, and that the profile of an async handler
+    also includes whatever else the event loop runs while the handler is suspended.
+    """
+
+    def __init__(self, directory: Path, sample_every: int = 10, keep: int = 10):
+        self.directory = Path(directory)
+        self.sample_every = sample_every
+        self.keep = keep
+        self._calls: Dict[str, int] = collections.Counter()
+        self._active = False
+
+    def _should_sample(self, handler_name: str) -> bool:
+        self._calls[handler_name] += 1
+        return not self._active and self._calls[handler_name] % self.sample_every == 0
+
+    def _rotate(self, handler_name: str) -> None:
+        files = sorted(self.directory.glob(handler_name + '-*.prof'))
+        for path in files[:-self.keep]:
+            path.unlink()
+
+    def _dump(self, handler_name: str, profile: cProfile.Profile) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / '{}-{}.prof'.format(handler_name, time.time_ns())
+        profile.dump_stats(str(path))
+        LOGGER.info('Wrote profile %s', path)
+        self._rotate(handler_name)
+
+    def wrap(self, func: Callable) -> Callable:
+        """
+        Wraps an async handler function so that it is tracked (see #track_handler()) and its
+        invocations are sampled.
+        """
+
+        func = track_handler(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not self._should_sample(func.__name__):
+                return await func(*args, **kwargs)
+            self._active = True
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._active = False
+                self._dump(func.__name__, profile)
+
+        return wrapper
+
+
+class SlowQueryLog:
+    """
+    Logs SQL statements that take at least *threshold* seconds to execute, together with
+    their `EXPLAIN` plan and the handler that issued them (see #current_handler).
+    """
+
+    def __init__(self, threshold: float, logger: logging.Logger = SLOW_QUERY_LOGGER):
+        self.threshold = threshold
+        self.logger = logger
+
+    def attach(self, target: Any = Engine) -> None:
+        """
+        Registers the event listeners on *target*. By default, listens on all engines.
+        """
+
+        event.listen(target, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(target, 'after_cursor_execute', self._after_cursor_execute)
+
+    def detach(self, target: Any = Engine) -> None:
+        event.remove(target, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(target, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # pylint: disable=unused-argument,too-many-arguments
+        # Keep the start time on the execution context rather than the connection, as the
+        # after_cursor_execute event does not fire for statements that raise.
+        if context is not None:
+            context._machma_query_start_time = time.perf_counter()  # pylint: disable=protected-access
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # pylint: disable=unused-argument,too-many-arguments
+        start_time = getattr(context, '_machma_query_start_time', None)
+        if start_time is None:
+            return
+        elapsed = time.perf_counter() - start_time
+        if elapsed < self.threshold:
+            return
+        plan = None
+        if not executemany and re.match(r'\s*SELECT\b', statement, re.I):
+            plan = self._explain(conn, statement, parameters)
+        self.logger.warning(
+            'Slow query (%.1f ms) in handler %s:\n%s\nParameters: %r\nPlan:\n%s',
+            elapsed * 1000, current_handler.get(), statement, parameters, plan or '  n/a')
+
+    def _explain(self, conn, statement: str, parameters: Any) -> Optional[str]:
+        # Use a raw DBAPI cursor so that we don't trigger our own event listeners.
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Unable to get EXPLAIN plan for slow query')
+            return None
+        finally:
+            cursor.close()
+        return '\n'.join('  ' + ' | '.join(str(col) for col in row) for row in rows)
@@ -0,0 +1,36 @@
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from machma import db
+from .dummy_data import create_dummy_data
+
+
+@pytest.fixture
+def dummy_db():
+    """
+    Initializes an ethereal in-memory database and commits the dummy data to it.
+    """
+
+    db.initialize_db('sqlite:///:memory:', create_tables=True)
+    with db.make_session():
+        create_dummy_data()
+
+
+@pytest.fixture
+def statements():
+    """
+    Collects the SQL statements that are executed on any engine while the test runs.
+    """
+
+    result = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args):  # pylint: disable=unused-argument
+        result.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield result
+    finally:
+        event.remove(Engine, 'before_cursor_execute', _before_cursor_execute)
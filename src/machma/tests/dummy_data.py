@@ -1,5 +1,5 @@
 
-from machma.db import session, Exercise, ExerciseAlias, User, UserReps
+from machma.db import session, ChatMember, Exercise, ExerciseAlias, User, UserReps
 
 
 def create_dummy_data():
@@ -29,3 +29,6 @@ def create_dummy_data():
     session.add(UserReps(user_id=u1.user_id, exercise_name=e3.exercise_name, reps=20))
 
     session.add(ExerciseAlias(exercise_alias='Triceps', exercise_name=e1.exercise_name))
+
+    session.add(ChatMember(chat_id=-100, user_id=u1.user_id))
+    session.add(ChatMember(chat_id=-100, user_id=u2.user_id))
@@ -30,6 +30,13 @@ def test_get_user():
     assert api.get_user(3) is None
 
 
+@with_db
+def test_get_user_row():
+    assert api.get_user_row(1) == api.UserRow(1, None, 'Eve', None)
+    assert api.get_user_row(3) is None
+    assert len(db.session.identity_map) == 0
+
+
 @with_db
 def test_has_user():
     assert api.has_user(1)
@@ -105,6 +112,43 @@ def test_get_user_todo_reps_for_exercise():
         api.get_user_todo_reps_for_exercise(2, 'Badoof')
 
 
+@with_db
+def test_get_chat_todo_reps():
+    assert api.get_chat_todo_reps(-100) == {
+        1: {'first_name': 'Eve', 'todos': {'Crunches': 30}},
+        2: {'first_name': 'John', 'todos': {'Dips': 20, 'Situps': 20}},
+    }
+    assert api.get_chat_todo_reps(-101) == {}
+
+    api.add_to_user_reps(1, 'Crunches', 30)
+    api.add_chat_member(-101, 1)
+    api.add_chat_member(-101, 1)
+    assert api.get_chat_todo_reps(-100) == {2: {'first_name': 'John', 'todos': {'Dips': 20, 'Situps': 20}}}
+    assert api.get_chat_todo_reps(-101) == {}
+
+
+@with_db
+def test_chat_members():
+    assert api.is_chat_member(-100, 1)
+    assert not api.is_chat_member(-101, 1)
+    api.add_chat_member(-101, 1)
+    api.add_chat_member(2, 2)
+    assert api.is_chat_member(-101, 1)
+    assert api.get_chats() == [-101, -100]
+
+
+@with_db
+def test_queries_are_baked():
+    api.get_user_todo_reps(1)
+    api.get_user_todo_reps_for_exercise(1, 'Dips')
+    api.get_user_reps(1, after='Crunches', limit=1)
+    cached = len(api.bakery.cache)
+    api.get_user_todo_reps(2)
+    api.get_user_todo_reps_for_exercise(2, 'Situps')
+    api.get_user_reps(2, after='Dips', limit=5)
+    assert len(api.bakery.cache) == cached
+
+
 @with_db
 def test_add_to_user_reps__update_existing():
     # Update existing user reps.
@@ -136,6 +180,13 @@ def test_get_exercise_by_alias():
     assert api.get_exercise_by_alias('Whales') is None
 
 
+@with_db
+def test_get_aliases():
+    assert api.get_aliases() == {'Triceps': 'Dips'}
+    api.add_exercise('Jumps')
+    assert api.get_aliases() == {'Triceps': 'Dips', 'Jumps': 'Jumps'}
+
+
 @with_db
 def test_add_alias():
     assert not api.has_alias('Foobar')
@@ -173,6 +224,31 @@ def test_get_exercises():
     }
 
 
+@with_db
+def test_get_exercise_rows():
+    assert api.get_exercise_rows(before='Situps', limit=1) == [('Dips', 'https://www.stack.com/a/dips')]
+    assert [r.exercise_name for r in api.get_exercise_rows()] == ['Crunches', 'Dips', 'Situps']
+    assert len(db.session.identity_map) == 0
+
+
+@with_db
+def test_get_exercises__paginated():
+    assert list(api.get_exercises(limit=2)) == ['Crunches', 'Dips']
+    assert list(api.get_exercises(after='Dips', limit=2)) == ['Situps']
+    assert list(api.get_exercises(before='Situps', limit=1)) == ['Dips']
+    assert list(api.get_exercises(after='Crunches', before='Situps')) == ['Dips']
+    assert api.get_exercises(after='Situps') == {}
+
+
+@with_db
+def test_get_user_reps__paginated():
+    assert api.get_user_reps(2, limit=2) == {'Crunches': 80, 'Dips': 10}
+    assert api.get_user_reps(2, after='Dips', limit=2) == {'Situps': 0}
+    assert api.get_user_todo_reps(2, limit=2) == {'Crunches': 0, 'Dips': 20}
+    assert api.get_user_todo_reps(2, after='Dips', limit=2) == {'Situps': 20}
+    assert list(api.get_user_todo_reps(2, before='Situps', limit=2)) == ['Crunches', 'Dips']
+
+
 @with_db
 def test_set_exercise_link():
     assert api.get_exercises()['Crunches']['link'] is None
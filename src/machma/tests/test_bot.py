@@ -0,0 +1,65 @@
+
+import asyncio
+
+from aiogram.utils.exceptions import MessageNotModified
+
+from machma import api, bot
+from .test_api import with_db
+
+
+def walk_pages(render):
+    """
+    Follows the "Weiter" buttons from the first page and returns the text of every page.
+    """
+
+    pages = []
+    text, markup = render()
+    pages.append(text)
+    while markup is not None:
+        data = [button.callback_data for button in markup.inline_keyboard[0] if button.text.startswith('Weiter')]
+        if not data:
+            break
+        assert len(data[0].encode('utf8')) <= bot.MAX_CALLBACK_DATA
+        direction, cursor = data[0].split(':')[-2:]
+        text, markup = render(direction, bot.decode_cursor(cursor))
+        pages.append(text)
+    return pages
+
+
+@with_db
+def test_pagination_with_long_exercise_names():
+    names = ['Übung{:02d}'.format(index) + 'x' * 47 for index in range(20)]
+    for name in names:
+        api.add_exercise(name)
+
+    pages = walk_pages(bot.render_exercises)
+    assert len(pages) == 2
+    for name in names:
+        assert sum(page.count(name) for page in pages) == 1
+
+    pages = walk_pages(lambda *args: bot.render_todos(1, 'Eve', *args))
+    assert len(pages) == 2
+
+
+def test_encode_cursor():
+    assert bot.encode_cursor('Dips', 10) == 'Dips'
+    cursor = bot.encode_cursor('Ü' * 20, 20)
+    assert len(cursor.encode('utf8')) <= 20
+    assert cursor.startswith('ÜÜÜÜÜ ')
+
+
+def test_edit_page_answers_if_not_modified():
+    answered = []
+
+    class FakeMessage:
+        async def edit_text(self, *args, **kwargs):
+            raise MessageNotModified('Message is not modified')
+
+    class FakeQuery:
+        message = FakeMessage()
+
+        async def answer(self):
+            answered.append(True)
+
+    asyncio.run(bot.edit_page(FakeQuery(), 'text', None))
+    assert answered == [True]
@@ -0,0 +1,70 @@
+
+import os
+import tempfile
+import threading
+
+import pytest
+
+from machma import api, db
+from .dummy_data import create_dummy_data
+
+
+@pytest.fixture
+def db_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = 'sqlite:///' + os.path.join(tmpdir, 'bot.db')
+        db.initialize_db(url, read_url=url, create_tables=True, connect_args={'timeout': 0.5})
+        with db.make_session():
+            create_dummy_data()
+        yield url
+
+
+def test_sqlite_file_uses_wal(db_file):
+    with db.make_read_session():
+        assert db.session.execute('PRAGMA journal_mode').scalar() == 'wal'
+
+
+def test_make_read_session_does_not_commit(db_file):
+    with db.make_read_session():
+        api.add_user(3, None, 'Test', None)
+    with db.make_read_session():
+        assert not api.has_user(3)
+
+
+def test_reads_do_not_block_long_write_transaction(db_file):
+    writer_started = threading.Event()
+    reads_done = threading.Event()
+    errors = []
+
+    def writer():
+        try:
+            with db.make_session():
+                api.add_to_user_reps(2, 'Situps', 5)
+                db.session.flush()
+                writer_started.set()
+                # Keep the write transaction open until the reader is done.
+                assert reads_done.wait(5)
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+            writer_started.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    assert writer_started.wait(5)
+
+    with db.make_read_session():
+        # pysqlite does not open a transaction for SELECT statements, so we start one explicitly
+        # to hold a read snapshot (and, without WAL, a SHARED lock) across the writer's commit.
+        db.session.execute('BEGIN')
+        # The uncommitted write is not visible, and the read is not blocked by it.
+        assert api.get_user_reps_for_exercise(2, 'Situps') == 0
+        reads_done.set()
+        # The writer can commit while our read transaction is still open.
+        thread.join(5)
+        assert not thread.is_alive()
+        # We still read from our snapshot.
+        assert api.get_user_reps_for_exercise(2, 'Situps') == 0
+
+    assert not errors
+    with db.make_read_session():
+        assert api.get_user_reps_for_exercise(2, 'Situps') == 5
@@ -0,0 +1,83 @@
+
+import asyncio
+import datetime
+
+from aiogram.utils.parts import MAX_MESSAGE_LENGTH
+
+from machma import api, db
+from machma.digest import DigestScheduler, render_digest, seconds_until
+
+
+class FakeBot:
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):  # pylint: disable=unused-argument
+        self.messages.append((asyncio.get_event_loop().time(), chat_id, text))
+
+
+def test_render_digest():
+    [text] = render_digest({2: {'first_name': 'John', 'todos': {'Dips': 20, 'Situps': 20}}})
+    assert '<a href="tg://user?id=2">John</a>: 20 Dips, 20 Situps' in text
+    [text] = render_digest({})
+    assert 'Alle sind auf Stand' in text
+
+
+def test_render_digest_is_split_into_messages(dummy_db):
+    with db.make_session():
+        for user_id in range(10, 15):
+            api.add_user(user_id, None, 'User {}'.format(user_id), None)
+            api.add_chat_member(-100, user_id)
+        for index in range(120):
+            api.add_exercise('Exercise{:03d}'.format(index))
+            api.add_to_user_reps(1, 'Exercise{:03d}'.format(index), 100)
+
+    with db.make_read_session():
+        members = api.get_chat_todo_reps(-100)
+    messages = render_digest(members)
+    assert len(messages) > 1
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for text in messages)
+    text = '\n\n'.join(messages)
+    for user_id, member in members.items():
+        assert 'id={}">{}</a>'.format(user_id, member['first_name']) in text
+    assert '100 Exercise119' in text
+
+
+def test_render_digest_truncates_long_member_lists():
+    todos = {'Exercise{:03d}'.format(index): 10 for index in range(100)}
+    messages = render_digest({2: {'first_name': 'John', 'todos': todos}}, max_length=300)
+    assert all(len(text) <= 300 for text in messages)
+    assert messages[-1].startswith('<a href="tg://user?id=2">John</a>: 10 Exercise000, ')
+    assert messages[-1].endswith(' weitere')
+
+
+def test_seconds_until():
+    now = datetime.datetime(2020, 9, 1, 19, 30)
+    assert seconds_until(datetime.time(20, 0), now) == 30 * 60
+    assert seconds_until(datetime.time(19, 0), now) == 23.5 * 60 * 60
+
+
+def test_send_digests_one_query_per_chat_and_staggered(dummy_db, statements):
+    with db.make_session():
+        db.session.add(db.ChatMember(chat_id=-200, user_id=1))
+
+    bot = FakeBot()
+    scheduler = DigestScheduler(datetime.time(20, 0), chats=[-100, -200], stagger=0.05)
+    executed = len(statements)
+    asyncio.run(scheduler.send_digests(bot))
+
+    assert len(statements) - executed == 2
+    assert [chat_id for _, chat_id, _ in bot.messages] == [-100, -200]
+    assert 'John' in bot.messages[0][2] and 'Eve' in bot.messages[0][2]
+    assert 'John' not in bot.messages[1][2]
+    assert bot.messages[1][0] - bot.messages[0][0] >= 0.05
+
+
+def test_send_digests_to_all_known_chats(dummy_db):
+    with db.make_session():
+        # A private chat with the bot, which must not receive the digest.
+        api.add_chat_member(1, 1)
+    bot = FakeBot()
+    asyncio.run(DigestScheduler(datetime.time(20, 0), stagger=0).send_digests(bot))
+    assert [chat_id for _, chat_id, _ in bot.messages] == [-100]
@@ -0,0 +1,59 @@
+
+from sqlalchemy import create_engine
+
+from machma import api, db
+from machma.inline import InlineIndex
+
+
+def test_match(dummy_db):
+    index = InlineIndex()
+    assert index.match('dip') == ['Dips']
+    assert index.match('') == ['Crunches', 'Dips', 'Situps']
+    assert index.match('tri') == ['Dips']
+    assert index.match('s') == ['Situps']
+    assert index.match('x') == []
+
+
+def test_search_is_answered_from_memory(dummy_db, statements):
+    with db.make_session():
+        api.add_alias('Dipsies', 'Dips')
+    index = InlineIndex()
+    assert index.search(2, 'd') == [('Dips', 20, 10)]
+    assert index.search(3, 'cr') == [('Crunches', 80, 0)]
+    queries = len(statements)
+    assert index.search(2, 'di') == [('Dips', 20, 10)]
+    assert index.search(2, 'dipsies') == [('Dips', 20, 10)]
+    assert index.search(3, 'c') == [('Crunches', 80, 0)]
+    assert len(statements) == queries
+
+
+def test_invalidated_on_commit(dummy_db):
+    # Another attached index must not swallow the invalidation.
+    other = InlineIndex()
+    other.attach(db.Session)
+    index = InlineIndex()
+    index.attach(db.Session)
+    try:
+        assert index.search(2, 'sit') == [('Situps', 20, 0)]
+
+        with db.make_session():
+            api.add_to_user_reps(2, 'Situps', 5)
+            api.add_exercise('Sprints')
+        assert index.search(2, 's') == [('Situps', 15, 5), ('Sprints', 0, 0)]
+    finally:
+        index.detach()
+        other.detach()
+
+
+def test_reloads_from_primary(dummy_db):
+    index = InlineIndex()
+    # Simulate a replica that lags behind: it has no data at all.
+    db.ReadSession.configure(bind=create_engine('sqlite:///:memory:'))
+    assert index.search(2, 'sit') == [('Situps', 20, 0)]
+
+
+def test_user_stats_are_capped(dummy_db):
+    index = InlineIndex(max_users=10)
+    for user_id in range(100):
+        index.search(user_id, 'd')
+    assert len(index._users) <= 20  # pylint: disable=protected-access
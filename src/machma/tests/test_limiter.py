@@ -0,0 +1,153 @@
+
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import types
+
+from machma.utils.aiogram.limiter import UpdateLimiter
+
+
+def make_message(chat_id, user_id):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), from_user=SimpleNamespace(id=user_id))
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_flood_is_limited_per_chat_and_shed():
+    limiter = UpdateLimiter(max_per_chat=2, max_queued_per_chat=3, max_global=4, max_queued_global=100)
+    in_flight = {}
+    max_in_flight = {}
+    handled = []
+
+    async def handler(message):
+        chat_id = message.chat.id
+        in_flight[chat_id] = in_flight.get(chat_id, 0) + 1
+        max_in_flight[chat_id] = max(max_in_flight.get(chat_id, 0), in_flight[chat_id])
+        await asyncio.sleep(0.01)
+        in_flight[chat_id] -= 1
+        handled.append(chat_id)
+
+    wrapped = limiter.wrap(handler)
+
+    async def main():
+        # A noisy chat floods us with 100 updates, a quiet chat sends a single one.
+        updates = [wrapped(make_message('noisy', i)) for i in range(100)]
+        updates.append(wrapped(make_message('quiet', 1)))
+        await asyncio.gather(*updates)
+
+    asyncio.run(main())
+
+    assert max_in_flight['noisy'] == 2
+    assert handled.count('noisy') == 5
+    assert handled.count('quiet') == 1
+    assert limiter.shed == {'chat_queue_full': 95}
+
+
+def test_global_queue_is_bounded():
+    limiter = UpdateLimiter(max_per_chat=1, max_queued_per_chat=10, max_global=2, max_queued_global=3)
+    handled = []
+
+    async def handler(message):
+        await asyncio.sleep(0.01)
+        handled.append(message.chat.id)
+
+    wrapped = limiter.wrap(handler)
+
+    async def main():
+        await asyncio.gather(*(wrapped(make_message(i, i)) for i in range(20)))
+
+    asyncio.run(main())
+
+    assert len(handled) == 5
+    assert limiter.shed == {'global_queue_full': 15}
+    assert not limiter._chats  # pylint: disable=protected-access
+
+
+def test_duplicates_are_dropped_within_window():
+    clock = FakeClock()
+    limiter = UpdateLimiter(dedupe_window=5.0, clock=clock)
+    handled = []
+
+    async def handler(message):
+        handled.append((message.chat.id, message.from_user.id))
+
+    wrapped = limiter.wrap(handler, dedupe=True)
+
+    async def main():
+        for _ in range(10):
+            await wrapped(make_message(1, 1))
+        await wrapped(make_message(1, 2))
+        clock.now = 5.0
+        await wrapped(make_message(1, 1))
+
+    asyncio.run(main())
+
+    assert handled == [(1, 1), (1, 2), (1, 1)]
+    assert limiter.shed == {'duplicate': 9}
+
+
+def test_shed_chats_are_not_retained():
+    limiter = UpdateLimiter(max_global=1, max_queued_global=0)
+
+    async def handler(message):  # pylint: disable=unused-argument
+        await asyncio.sleep(0.01)
+
+    wrapped = limiter.wrap(handler)
+
+    async def main():
+        await asyncio.gather(*(wrapped(make_message(i, i)) for i in range(1000)))
+
+    asyncio.run(main())
+
+    assert limiter.shed == {'global_queue_full': 999}
+    assert not limiter._chats  # pylint: disable=protected-access
+
+
+def test_shed_updates_do_not_count_as_duplicates():
+    limiter = UpdateLimiter(max_per_chat=1, max_queued_per_chat=0)
+    handled = []
+
+    async def handler(message):
+        await asyncio.sleep(0.01)
+        handled.append(message.from_user.id)
+
+    wrapped = limiter.wrap(handler, dedupe=True)
+
+    async def main():
+        # The second user is shed because the chat is busy, but their retry must go through.
+        await asyncio.gather(wrapped(make_message(1, 1)), wrapped(make_message(1, 2)))
+        await wrapped(make_message(1, 2))
+
+    asyncio.run(main())
+
+    assert handled == [1, 2]
+    assert limiter.shed == {'chat_queue_full': 1}
+
+
+def test_shed_callback_queries_are_answered():
+    limiter = UpdateLimiter(max_per_chat=1, max_queued_per_chat=0)
+    answered = []
+
+    class FakeQuery(types.CallbackQuery):
+        async def answer(self, *args, **kwargs):  # pylint: disable=arguments-differ
+            answered.append(self.id)
+
+    async def handler(query):  # pylint: disable=unused-argument
+        await asyncio.sleep(0.01)
+
+    wrapped = limiter.wrap(handler)
+
+    async def main():
+        queries = [FakeQuery(id=str(i), message=types.Message(chat=types.Chat(id=1))) for i in range(3)]
+        await asyncio.gather(*(wrapped(query) for query in queries))
+
+    asyncio.run(main())
+
+    assert answered == ['1', '2']
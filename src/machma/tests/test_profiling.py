@@ -0,0 +1,84 @@
+
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from machma import api, db, profiling
+from .test_api import with_db
+
+
+@with_db
+def test_slow_query_log(caplog):
+    log = profiling.SlowQueryLog(0)
+    log.attach()
+
+    @profiling.track_handler
+    async def show_todos():
+        return api.get_user_todo_reps(1)
+
+    try:
+        with caplog.at_level(logging.WARNING, logger=profiling.SLOW_QUERY_LOGGER.name):
+            asyncio.run(show_todos())
+    finally:
+        log.detach()
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages
+    assert all('in handler show_todos' in m for m in messages)
+    assert any('SCAN' in m or 'SEARCH' in m for m in messages)
+
+
+@with_db
+def test_slow_query_log_survives_failing_statements(caplog):
+    log = profiling.SlowQueryLog(0)
+    log.attach()
+    try:
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        with caplog.at_level(logging.WARNING, logger=profiling.SLOW_QUERY_LOGGER.name):
+            api.get_user_todo_reps(1)
+        info = db.session.connection().connection.info
+    finally:
+        log.detach()
+
+    assert caplog.records
+    assert 'machma_query_start_time' not in info
+
+
+def test_handler_profiler_samples_and_rotates(tmp_path):
+    profiler = profiling.HandlerProfiler(tmp_path, sample_every=2, keep=3)
+
+    async def handler():
+        return profiling.current_handler.get()
+
+    wrapped = profiler.wrap(handler)
+
+    async def main():
+        return [await wrapped() for _ in range(10)]
+
+    assert asyncio.run(main()) == ['handler'] * 10
+    assert len(list(tmp_path.glob('handler-*.prof'))) == 3
+
+
+def test_handler_profiler_samples_per_handler(tmp_path):
+    profiler = profiling.HandlerProfiler(tmp_path, sample_every=2)
+
+    async def show_todos():
+        pass
+
+    async def add_reps():
+        pass
+
+    wrapped = [profiler.wrap(show_todos), profiler.wrap(add_reps)]
+
+    async def main():
+        for _ in range(4):
+            for handler in wrapped:
+                await handler()
+
+    asyncio.run(main())
+    assert len(list(tmp_path.glob('show_todos-*.prof'))) == 2
+    assert len(list(tmp_path.glob('add_reps-*.prof'))) == 2
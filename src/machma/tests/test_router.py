@@ -0,0 +1,49 @@
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.dispatcher.handler import SkipHandler
+
+from machma.utils.aiogram.router import CommandRouter, parse_command
+
+
+def test_parse_command():
+    assert parse_command('/done 10  Dips') == ('done', ['10', 'Dips'])
+    assert parse_command('/Todos@Machma10Bot') == ('todos@machma10bot', [])
+    assert parse_command('/') is None
+    assert parse_command('/ done') is None
+    assert parse_command('done') is None
+    assert parse_command(None) is None
+
+
+class FakeBot:
+
+    @property
+    async def me(self):
+        return SimpleNamespace(username='Machma10Bot')
+
+
+def test_router_dispatch():
+    calls = []
+
+    async def handler(message, args):
+        calls.append((message.text, args))
+
+    router = CommandRouter()
+    router.add(['todo', 'todos'], handler)
+    with pytest.raises(ValueError):
+        router.add(['TODO'], handler)
+
+    def dispatch(text):
+        message = SimpleNamespace(text=text, bot=FakeBot())
+        return asyncio.run(router.dispatch(message))
+
+    dispatch('/todos a b')
+    dispatch('/TODO@machma10bot')
+    for text in ['/todos@otherbot', '/help', 'todos']:
+        with pytest.raises(SkipHandler):
+            dispatch(text)
+
+    assert calls == [('/todos a b', ['a', 'b']), ('/TODO@machma10bot', [])]
+    assert router.lookup('todos@machma10bot') is handler
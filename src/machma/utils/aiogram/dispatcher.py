@@ -1,20 +1,75 @@
 
+from typing import Callable, Optional
+
 from aiogram import Bot, Dispatcher
 
+from .limiter import UpdateLimiter
+from .router import CommandRouter
+
 
 class ProxyDispatcher:
+    """
+    Collects handlers before a #Dispatcher is available. If a #UpdateLimiter is specified, all
+    handlers are executed through it. Handlers registered with `dedupe=True` drop repeated
+    invocations by the same user (see #UpdateLimiter).
+
+    Command handlers registered with #command() are dispatched through a single #CommandRouter
+    instead of one aiogram handler (and filter chain) per command.
+    """
+
+    def __init__(self, limiter: Optional[UpdateLimiter] = None):
+        self.limiter = limiter
+        self._commands = []
+        self._handlers = []
+
+    def _register(self, kind: str, args, kwargs, dedupe: bool):
+        def decorator(func):
+            self._handlers.append((kind, func, dedupe, args, kwargs))
+            return func
+        return decorator
 
-    def __init__(self):
-        self._message_handlers = []
+    def command(self, *commands: str, dedupe: bool = False):
+        """
+        Registers a handler for the specified commands. The handler is called with the message
+        and the list of whitespace separated arguments.
+        """
 
-    def message_handler(self, *args, **kwargs):
         def decorator(func):
-            self._message_handlers.append((func, args, kwargs))
+            self._commands.append((commands, func, dedupe))
             return func
         return decorator
 
-    def to_dispatcher(self, bot: Bot) -> Dispatcher:
+    def message_handler(self, *args, dedupe: bool = False, **kwargs):
+        return self._register('message_handler', args, kwargs, dedupe)
+
+    def callback_query_handler(self, *args, dedupe: bool = False, **kwargs):
+        return self._register('callback_query_handler', args, kwargs, dedupe)
+
+    def inline_handler(self, *args, dedupe: bool = False, **kwargs):
+        return self._register('inline_handler', args, kwargs, dedupe)
+
+    def _wrap(self, func: Callable, dedupe: bool, wrapper: Optional[Callable[[Callable], Callable]]) -> Callable:
+        if wrapper is not None:
+            func = wrapper(func)
+        if self.limiter is not None:
+            func = self.limiter.wrap(func, dedupe=dedupe)
+        return func
+
+    def build_router(self, wrapper: Optional[Callable[[Callable], Callable]] = None) -> CommandRouter:
+        router = CommandRouter()
+        for commands, func, dedupe in self._commands:
+            router.add(commands, self._wrap(func, dedupe, wrapper))
+        return router
+
+    def to_dispatcher(self, bot: Bot, wrapper: Optional[Callable[[Callable], Callable]] = None) -> Dispatcher:
+        """
+        Creates a #Dispatcher with all handlers registered. If *wrapper* is specified, it is
+        applied to every handler (inside of the #UpdateLimiter, if any).
+        """
+
         dp = Dispatcher(bot)
-        for func, args, kwargs in self._message_handlers:
-            dp.message_handler(*args, **kwargs)(func)
+        if self._commands:
+            dp.message_handler()(self.build_router(wrapper).dispatch)
+        for kind, func, dedupe, args, kwargs in self._handlers:
+            getattr(dp, kind)(*args, **kwargs)(self._wrap(func, dedupe, wrapper))
         return dp
@@ -0,0 +1,154 @@
+
+import asyncio
+import collections
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import types
+from aiogram.utils.exceptions import TelegramAPIError
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _get_chat_id(update: Any) -> Optional[Hashable]:
+    # Callback queries carry the message that they originate from. Inline queries are not
+    # associated with a chat, so we limit them per user instead.
+    message = getattr(update, 'message', None) or update
+    chat = getattr(message, 'chat', None)
+    if chat:
+        return chat.id
+    from_user = getattr(update, 'from_user', None)
+    return ('user', from_user.id) if from_user else None
+
+
+async def _answer_shed(update: Any) -> None:
+    # Answer callback queries that we drop, otherwise the client shows a spinner until it times out.
+    if not isinstance(update, types.CallbackQuery):
+        return
+    try:
+        await update.answer()
+    except TelegramAPIError:
+        LOGGER.debug('Unable to answer shed callback query', exc_info=True)
+
+
+class _ChatState:
+
+    def __init__(self, max_in_flight: int):
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.pending = 0
+
+
+class UpdateLimiter:
+    """
+    Limits how many message handlers run concurrently, per chat and globally. Updates that
+    can not run immediately are queued up to a bounded number, any further updates are shed.
+    Handlers that are wrapped with *dedupe* enabled additionally drop repeated invocations by
+    the same user in the same chat within the *dedupe_window* (in seconds). Only admitted
+    updates count towards the dedupe window, and shed callback queries are still answered.
+
+    The number of shed updates is counted by reason in #shed.
+    """
+
+    def __init__(
+        self,
+        max_per_chat: int = 2,
+        max_queued_per_chat: int = 4,
+        max_global: int = 16,
+        max_queued_global: int = 64,
+        dedupe_window: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_per_chat = max_per_chat
+        self.max_queued_per_chat = max_queued_per_chat
+        self.max_global = max_global
+        self.max_queued_global = max_queued_global
+        self.dedupe_window = dedupe_window
+        self.clock = clock
+        self.shed: Dict[str, int] = collections.Counter()
+        self._global: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        self._chats: Dict[Hashable, _ChatState] = {}
+        self._recent: Dict[Hashable, float] = collections.OrderedDict()
+
+    def _shed(self, reason: str, chat_id: Hashable) -> None:
+        self.shed[reason] += 1
+        LOGGER.debug('Shedding update in chat %s (%s)', chat_id, reason)
+
+    def _is_duplicate(self, key: Hashable) -> bool:
+        now = self.clock()
+        while self._recent:
+            oldest_key, timestamp = next(iter(self._recent.items()))
+            if now - timestamp < self.dedupe_window:
+                break
+            del self._recent[oldest_key]
+        return key in self._recent
+
+    def _get_shed_reason(self, chat_id: Hashable, dedupe_key: Optional[Hashable]) -> Optional[str]:
+        if dedupe_key is not None and self._is_duplicate(dedupe_key):
+            return 'duplicate'
+        state = self._chats.get(chat_id)
+        if state is not None and state.pending >= self.max_per_chat + self.max_queued_per_chat:
+            return 'chat_queue_full'
+        if self._pending >= self.max_global + self.max_queued_global:
+            return 'global_queue_full'
+        return None
+
+    async def run(
+        self,
+        chat_id: Hashable,
+        func: Callable,
+        *args,
+        dedupe_key: Optional[Hashable] = None,
+        on_shed: Optional[Callable[[], Awaitable]] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Runs the coroutine function *func* with the given arguments within the limits for the
+        specified *chat_id*. Returns #None without calling *func* if the update is shed, after
+        awaiting *on_shed* (if specified).
+        """
+
+        reason = self._get_shed_reason(chat_id, dedupe_key)
+        if reason is not None:
+            self._shed(reason, chat_id)
+            if on_shed is not None:
+                await on_shed()
+            return None
+
+        if dedupe_key is not None:
+            self._recent[dedupe_key] = self.clock()
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState(self.max_per_chat)
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_global)
+
+        state.pending += 1
+        self._pending += 1
+        try:
+            async with state.semaphore, self._global:
+                return await func(*args, **kwargs)
+        finally:
+            state.pending -= 1
+            self._pending -= 1
+            if state.pending == 0:
+                del self._chats[chat_id]
+
+    def wrap(self, func: Callable, dedupe: bool = False) -> Callable:
+        """
+        Wraps an aiogram message, callback query or inline query handler so that it is executed through #run().
+        """
+
+        @functools.wraps(func)
+        async def wrapper(update, *args, **kwargs):
+            chat_id = _get_chat_id(update)
+            dedupe_key = None
+            if dedupe:
+                user_id = update.from_user.id if update.from_user else None
+                dedupe_key = (chat_id, user_id, func)
+            on_shed = functools.partial(_answer_shed, update)
+            return await self.run(chat_id, func, update, *args, dedupe_key=dedupe_key, on_shed=on_shed, **kwargs)
+
+        return wrapper
@@ -0,0 +1,67 @@
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import types
+from aiogram.dispatcher.handler import SkipHandler
+
+
+def parse_command(text: Optional[str]) -> Optional[Tuple[str, List[str]]]:
+    """
+    Splits a command message like `/done@botname 10 Dips` into the lowercase command including
+    the mention (`done@botname`) and the whitespace separated arguments. Returns #None if the
+    text is not a command.
+    """
+
+    if not text or len(text) < 2 or text[0] != '/' or text[1].isspace():
+        return None
+    command, *args = text[1:].split()
+    return command.lower(), args
+
+
+class CommandRouter:
+    """
+    Maps commands to their handlers with a single dictionary lookup per update. The table
+    contains every alias of a command, and once the bot's username is known, also every alias
+    with the `@username` suffix. Handlers are called with the message and the list of arguments.
+    """
+
+    def __init__(self):
+        self._commands: Dict[str, Callable] = {}
+        self._names: List[str] = []
+        self._username: Optional[str] = None
+
+    def add(self, commands: Iterable[str], func: Callable) -> None:
+        for command in commands:
+            command = command.lower()
+            if command in self._commands:
+                raise ValueError('command {!r} is already registered'.format(command))
+            self._names.append(command)
+            self._commands[command] = func
+            if self._username:
+                self._commands[command + '@' + self._username] = func
+
+    def set_username(self, username: str) -> None:
+        self._username = username.lower()
+        for command in self._names:
+            self._commands[command + '@' + self._username] = self._commands[command]
+
+    def lookup(self, command: str) -> Optional[Callable]:
+        return self._commands.get(command)
+
+    async def dispatch(self, message: types.Message) -> None:
+        """
+        The single message handler entry point. Raises #SkipHandler if the message is not a
+        command handled by this router, so that other handlers get a chance to process it.
+        """
+
+        parsed = parse_command(message.text)
+        if parsed is None:
+            raise SkipHandler()
+        command, args = parsed
+        func = self._commands.get(command)
+        if func is None and self._username is None and '@' in command:
+            self.set_username((await message.bot.me).username)
+            func = self._commands.get(command)
+        if func is None:
+            raise SkipHandler()
+        return await func(message, args)